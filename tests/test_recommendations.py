@@ -0,0 +1,37 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "library management system using ai .py")
+
+
+@pytest.fixture
+def lms(tmp_path, monkeypatch):
+    """A fresh copy of the application module working on a database in tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    spec = importlib.util.spec_from_file_location("library_app", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, "library_app", module)  # the index pickles its class by module name
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_search_falls_back_when_the_best_matches_are_on_loan(lms):
+    index = lms.get_recommendation_index()
+    for volume in range(1, 21):
+        lms.create_book(f"Deep Learning Volume {volume}", "Author", "Deep Learning")
+    index.refit()
+    k = 3
+    # Lend out every candidate a cache miss would fetch.
+    scores = index.similarities("deep learning")
+    borrowed = index.book_ids[lms.top_k_indices(scores, scores >= 0, k * lms.QUERY_CACHE_OVERFETCH)].tolist()
+    for book_id in borrowed:
+        lms.checkout_book(1, int(book_id))
+
+    books = lms.recommend_books("deep learning", k=k)
+    assert len(books) == k
+    assert not set(books['id']) & set(borrowed)
+    # The second call is served from the cache entry left by the first.
+    assert lms.recommend_books("deep learning", k=k)['id'].tolist() == books['id'].tolist()